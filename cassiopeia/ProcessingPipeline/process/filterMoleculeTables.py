@@ -162,32 +162,35 @@ def errorCorrectUMI(moleculetable, outputdir, bcDistThresh = 1, allelePropThresh
         # If we have more than one UMI in a cellBC (this should definitely be true)
         g = g.sort_values("readCount", ascending=False).reset_index()
         if g.shape[0] > 0:
-            corrected_r = []
+            corrected_r = set()
+
+            # pull the columns out once so the pairwise loop avoids pandas indexing
+            umis, alleles, ibcs = g["UMI"].values, g["allele"].values, g["intBC"].values
+            counts = g["readCount"].values
+
             for r1 in range(g.shape[0]):
 
-                uBC1, allele1, iBC1 = g.loc[r1, "UMI"], g.loc[r1, "allele"], g.loc[r1, "intBC"]
+                uBC1, allele1, iBC1 = umis[r1], alleles[r1], ibcs[r1]
 
                 for r2 in range(r1 + 1, g.shape[0]):
 
-                    uBC2, allele2, iBC2 = g.loc[r2, "UMI"],  g.loc[r2, "allele"], g.loc[r2, "intBC"]
+                    uBC2, allele2, iBC2 = umis[r2], alleles[r2], ibcs[r2]
 
                     # Compute the levenshtein distance between both umis
                     bcl = Levenshtein.distance(uBC1, uBC2)
 
                     # If we've found two UMIs thmt are reasonably similar with the same allele and iBC, let's try to error correct.
                     if bcl <= bcDistThresh and allele1 == allele2 and iBC1 == iBC2:
-                        totalCount = g.loc[[r1, r2], "readCount"].sum()
-
-                        props = g.loc[[r1, r2], "readCount"] / totalCount
+                        totalCount = counts[r1] + counts[r2]
 
                         # Let's just error correct towards the more highly represented UMI iff the allele proportion of the lowly
                         # represented UMI is below some threshold
-                        if props[r2] <= allelePropThresh and r1 not in corrected_r:
+                        if counts[r2] / totalCount <= allelePropThresh and r1 not in corrected_r:
 
                             badlocs = moleculetable[(moleculetable["cellBC"] == n) & (moleculetable["UMI"] == uBC2)]
                             corrlocs = moleculetable[(moleculetable["cellBC"] == n) & (moleculetable["UMI"] == uBC1)]
 
-                            corrected_r.append(r2)
+                            corrected_r.add(r2)
 
 
                             if len(badlocs.index.values) > 0 and badlocs.index.values[0] in moleculetable.index:
@@ -199,12 +202,12 @@ def errorCorrectUMI(moleculetable, outputdir, bcDistThresh = 1, allelePropThresh
                             #to_drop = np.concatenate((to_drop, badlocs.index.values))
 
                             num_UMI_corrected += 1
-                            num_reads_corrected += g.loc[r2, "readCount"]
+                            num_reads_corrected += counts[r2]
 
                             if verbose:
                                 with open(outputdir + "/eclog_umi.txt", "a") as f:
                                     f.write(n + "\t" + uBC2 + "\t" + uBC1 + "\t")
-                                    f.write(str(g.loc[r2, "readCount"]) + "\t" + str(g.loc[r1, "readCount"]) + "\n")
+                                    f.write(str(counts[r2]) + "\t" + str(counts[r1]) + "\n")
 
 
     # log results
@@ -296,25 +299,27 @@ def errorCorrectIntBC(moleculetable, outputdir, prop = 0.5, umiCountThresh = 10,
         if x1.shape[0] > 1:
 
             badList = []
-            for r1 in range(x1.shape[0]):
 
-                iBC1, allele1 = x1.loc[r1, "intBC"], x1.loc[r1, "allele"]
+            # hoist the columns and row count to locals for the pairwise loop
+            n_rows = x1.shape[0]
+            ibcs, alleles, umi_counts = x1["intBC"].values, x1["allele"].values, x1["UMI"].values
 
-                for r2 in range(r1 + 1, x1.shape[0]):
+            for r1 in range(n_rows):
 
-                    iBC2, allele2 = x1.loc[r2, "intBC"], x1.loc[r2, "allele"]
+                iBC1, allele1 = ibcs[r1], alleles[r1]
+
+                for r2 in range(r1 + 1, n_rows):
+
+                    iBC2, allele2 = ibcs[r2], alleles[r2]
 
                     bclDist = Levenshtein.distance(iBC1, iBC2)
 
                     if bclDist <= bcDistThresh and allele1 == allele2:
 
-                        totalCount = x1.loc[[r1, r2], "UMI"].sum()
-
-                        props = x1.loc[[r1, r2], "UMI"] / totalCount
-                        umiCounts = x1.loc[[r1, r2], "UMI"]
+                        totalCount = umi_counts[r1] + umi_counts[r2]
 
                         # if the alleles are the same and the proportions are good, then let's error correct
-                        if props[r2] < prop and umiCounts[r2] <= umiCountThresh:
+                        if umi_counts[r2] / totalCount < prop and umi_counts[r2] <= umiCountThresh:
                             bad_locs = moleculetable[(moleculetable["cellBC"] == name) & (moleculetable["intBC"] == iBC2) &
                                                    (moleculetable["allele"] == allele2)]
 
@@ -326,7 +331,7 @@ def errorCorrectIntBC(moleculetable, outputdir, prop = 0.5, umiCountThresh = 10,
                             if verbose:
                                 with open(outputdir + "/eclog_intbc.txt", "a") as f:
                                     f.write(name + "\t" + iBC2 + "\t" + iBC1 + "\t")
-                                    f.write(str(x1.loc[r2, "UMI"]) + "\t" + str(x1.loc[r1, "UMI"]) + "\n")
+                                    f.write(str(umi_counts[r2]) + "\t" + str(umi_counts[r1]) + "\n")
 
 
     # log data
@@ -160,8 +160,7 @@ def rand_cmap(nlabels, type='bright', first_color_black=True, last_color_black=F
     :param verbose: Prints the number of labels and shows the colormap. True or False
     :return: colormap for matplotlib
     """
-    from matplotlib.colors import LinearSegmentedColormap
-    import colorsys
+    from matplotlib.colors import LinearSegmentedColormap, hsv_to_rgb
 
     if type not in ('bright', 'soft'):
         print ('Please choose "bright" or "soft" for type')
@@ -172,14 +171,10 @@ def rand_cmap(nlabels, type='bright', first_color_black=True, last_color_black=F
 
     # Generate color map for bright colors, based on hsv
     if type == 'bright':
-        randHSVcolors = [(np.random.uniform(low=0.0, high=1),
-                          np.random.uniform(low=0.2, high=1),
-                          np.random.uniform(low=0.9, high=1)) for i in range(nlabels)]
+        randHSVcolors = np.random.uniform(low=[0.0, 0.2, 0.9], high=[1, 1, 1], size=(nlabels, 3))
 
-        # Convert HSV list to RGB
-        randRGBcolors = []
-        for HSVcolor in randHSVcolors:
-            randRGBcolors.append(colorsys.hsv_to_rgb(HSVcolor[0], HSVcolor[1], HSVcolor[2]))
+        # Convert HSV array to RGB in a single vectorized call
+        randRGBcolors = hsv_to_rgb(randHSVcolors)
 
         if first_color_black:
             randRGBcolors[0] = [0, 0, 0]
@@ -193,9 +188,7 @@ def rand_cmap(nlabels, type='bright', first_color_black=True, last_color_black=F
     if type == 'soft':
         low = 0.6
         high = 0.95
-        randRGBcolors = [(np.random.uniform(low=low, high=high),
-                          np.random.uniform(low=low, high=high),
-                          np.random.uniform(low=low, high=high)) for i in range(nlabels)]
+        randRGBcolors = np.random.uniform(low=low, high=high, size=(nlabels, 3))
 
         if first_color_black:
             randRGBcolors[0] = [0, 0, 0]
@@ -284,32 +277,17 @@ def plot_overlap_heatmap(at_pivot_I, at, outputdir):
 
 def add_cutsite_encoding(lg_group):
 
-    lg_group["s1"] = 0
-    lg_group["s2"] = 0
-    lg_group["s3"] = 0
-
-
-    for i in lg_group.index:
-        if lg_group.loc[i, "r1"] == "['None']":
-            lg_group.loc[i, "s1"] = .9
-        elif "D" in lg_group.loc[i, "r1"]:
-            lg_group.loc[i, "s1"] = 1.9
-        elif 'I' in lg_group.loc[i, "r1"]:
-            lg_group.loc[i, 's1'] = 2.9
-
-        if lg_group.loc[i, "r2"] == "['None']":
-            lg_group.loc[i, "s2"] = .9
-        elif "D" in lg_group.loc[i, "r2"]:
-            lg_group.loc[i, "s2"] = 1.9
-        elif 'I' in lg_group.loc[i, "r2"]:
-            lg_group.loc[i, 's2'] = 2.9
-
-        if lg_group.loc[i, "r3"] == "['None']":
-            lg_group.loc[i, "s3"] = .9
-        elif "D" in lg_group.loc[i, "r3"]:
-            lg_group.loc[i, "s3"] = 1.9
-        elif 'I' in lg_group.loc[i, "r3"]:
-            lg_group.loc[i, 's3'] = 2.9
+    for r, s in zip(["r1", "r2", "r3"], ["s1", "s2", "s3"]):
+        alleles = lg_group[r].astype(str)
+        lg_group[s] = np.select(
+            [
+                alleles == "['None']",
+                alleles.str.contains("D", regex=False),
+                alleles.str.contains("I", regex=False),
+            ],
+            [0.9, 1.9, 2.9],
+            default=0,
+        )
 
     return lg_group
 
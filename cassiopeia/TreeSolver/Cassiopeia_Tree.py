@@ -143,46 +143,28 @@ class Cassiopeia_Tree:
 		return [n for n in self.network if n.is_target]
 
 	def collapse_edges(self):
-
-		def _collapse(graph, edges_to_collapse):
-		
-			new_network = nx.DiGraph()
-			root = [n for n in graph if graph.in_degree(n) == 0][0]
-			for n in nx.dfs_postorder_nodes(graph, source=root):
-				if n == root:
-					continue
-				edge = (list(graph.predecessors(n))[0], n)
-				if edge[0].get_character_vec() == edge[1].get_character_vec():
-					for p in graph.predecessors(edge[0]):
-						new_network.add_edge(p, edge[1])
-				else:
-					new_network.add_edge(edge[0], edge[1])
-
-			return new_network
-
-		def find_edges_to_collapse(graph):
-			edges = []
-			source = [n for n in graph if graph.in_degree(n) == 0][0]
-
-			for e in nx.dfs_edges(graph, source=source):
-				if e[0].get_character_vec() == e[1].get_character_vec():
-					edges.append(e)
-			return edges[::-1]
+		"""
+		Collapse edges that carry no mutations. Every node is reattached to its nearest ancestor
+		with a different character vector (or to the root), so a node with the same states as its
+		parent becomes a sibling of that parent.
+		"""
 
 		net = self.network
 		root = [n for n in net if net.in_degree(n) == 0][0]
 
-		edges_to_collapse = find_edges_to_collapse(net)
-		while len(edges_to_collapse) > 0:
-			net = _collapse(net)
-			edges_to_collapse = find_edges_to_collapse(net)
-
-		to_remove = []
-		for n in net.nodes:
-			if net.in_degree(n) == 0 and n != root:
-				to_remove.append(n)
+		# resolve every node's new parent in one top-down pass: a child of a node with
+		# the same character states inherits that node's (already resolved) parent
+		new_parent = {}
+		for p, n in nx.dfs_edges(net, source=root):
+			if p == root or p.get_character_vec() != n.get_character_vec():
+				new_parent[n] = p
+			else:
+				new_parent[n] = new_parent[p]
 
-		net.remove_nodes_from(to_remove)
+		# rewire all collapsed edges in one batch
+		to_rewire = [(p, n) for p, n in net.edges if new_parent.get(n, p) != p]
+		net.remove_edges_from(to_rewire)
+		net.add_edges_from([(new_parent[n], n) for p, n in to_rewire])
 
 		self.network = net
 		self.newick = convert_network_to_newick_format(self.network)
@@ -231,12 +213,9 @@ class Cassiopeia_Tree:
 
 		assert self.cm is not None
 
-		net = self.get_network().copy()
-		copy_dict = {}
-		for n in net:
-			copy_dict[n] = copy.copy(n)
-
-		net = nx.relabel_nodes(net, copy_dict)
+		# scoring only reads the tree, so score the stored network in place
+		# rather than copying the graph and every node first
+		net = self.get_network()
 
 		#net = fill_in_tree(net, cm)
 		#net = tree_collapse(net)
@@ -306,12 +285,12 @@ class Cassiopeia_Tree:
 			if n.char_string == triplet[2].char_string:
 				c = n
 
-		a_ancestors = [node for node in nx.ancestors(self.network, a)]
-		b_ancestors = [node for node in nx.ancestors(self.network, b)]
-		c_ancestors = [node for node in nx.ancestors(self.network, c)]
-		ab_common = len(set(a_ancestors) & set(b_ancestors))
-		ac_common = len(set(a_ancestors) & set(c_ancestors))
-		bc_common = len(set(b_ancestors) & set(c_ancestors))
+		a_ancestors = nx.ancestors(self.network, a)
+		b_ancestors = nx.ancestors(self.network, b)
+		c_ancestors = nx.ancestors(self.network, c)
+		ab_common = len(a_ancestors & b_ancestors)
+		ac_common = len(a_ancestors & c_ancestors)
+		bc_common = len(b_ancestors & c_ancestors)
 		index = min(ab_common, bc_common, ac_common)
 
 		true_common = '-'
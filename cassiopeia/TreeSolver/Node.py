@@ -1,5 +1,5 @@
 import hashlib 
-import numpy as np
+import math
 
 class Node:
 	"""
@@ -49,7 +49,7 @@ class Node:
 
 		self.name = name
 		self.char_vec = [str(c) for c in character_vec]
-		self.char_string = '|'.join([str(c) for c in character_vec])
+		self.char_string = '|'.join(self.char_vec)
 		self.pid = pid
 		self.is_target = is_target
 		self.support = support
@@ -98,8 +98,7 @@ class Node:
 
 		"""
 
-		cs1, cs2 = self.get_character_string(), node2.get_character_string()
-		x_list, y_list = cs1.split("|"), cs2.split("|")
+		x_list, y_list = self.get_character_vec(), node2.get_character_vec()
 
 		count = 0
 		for i in range(0, len(x_list)):
@@ -112,7 +111,7 @@ class Node:
 				if not priors:
 					count += 1
 				else:
-					count += -np.log(priors[i][str(y_list[i])])
+					count += -math.log(priors[i][str(y_list[i])])
 			else:
 				return -1
 		return count
@@ -134,8 +133,7 @@ class Node:
 			A score, normalized by the number of characters that were observed in both nodes.
 		"""
 
-		cs1, cs2 = self.get_character_string(), node2.get_character_string()
-		x_list, y_list = cs1.split("|"), cs2.split("|")
+		x_list, y_list = self.get_character_vec(), node2.get_character_vec()
 		
 		count = 0
 		for i in range(0, len(x_list)):
@@ -12,7 +12,6 @@ from string import ascii_uppercase
 
 
 import argparse
-from tqdm import tqdm
 
 import Bio.Phylo as Phylo
 from Bio.Phylo.TreeConstruction import DistanceCalculator, ParsimonyScorer, DistanceTreeConstructor
@@ -20,7 +19,7 @@ from Bio import AlignIO
 from Bio.Align import MultipleSeqAlignment
 from skbio import DistanceMatrix
 from skbio.tree import nj
-from numba import jit
+from numba import njit, prange
 import scipy as sp
 
 import networkx as nx
@@ -31,6 +30,7 @@ import os
 from cassiopeia.TreeSolver.utilities import fill_in_tree, tree_collapse, newick_to_network
 from cassiopeia.TreeSolver.Node import Node
 from cassiopeia.TreeSolver.Cassiopeia_Tree import Cassiopeia_Tree
+from cassiopeia.TreeSolver.binarize_multistate_charmat import multi_map, construct_file
 
 import cassiopeia as sclt
 
@@ -45,16 +45,10 @@ def run_nj_naive(cm_uniq, stem, verbose = True):
 
     cm_lookup = list(cm_uniq.apply(lambda x: "|".join(x.values), axis=1))
 
-    fn = stem + "phylo.txt"
     infile = stem + "infile.txt"
-    
-    cm_uniq.to_csv(fn, sep='\t')
-    
-    script = (SCLT_PATH / 'TreeSolver' / 'binarize_multistate_charmat.py')
-    cmd =  "python3.6 " + str(script) +  " " + fn + " " + infile + " --relaxed" 
-    p = subprocess.Popen(cmd, shell=True)
-    pid, ecode = os.waitpid(p.pid, 0)
-    
+
+    write_binarized_charmat(cm_uniq, infile, relaxed=True)
+
     aln = AlignIO.read(infile, "phylip-relaxed")
 
     calculator = DistanceCalculator('identity')
@@ -94,8 +88,8 @@ def run_nj_naive(cm_uniq, stem, verbose = True):
     state_tree = nj_net
     ret_tree =  Cassiopeia_Tree(method='neighbor-joining', network=state_tree, name='Cassiopeia_state_tree')
 
-    os.system("rm " + infile)
-    os.system("rm " + fn)
+    if os.path.exists(infile):
+        os.remove(infile)
 
     return ret_tree
 
@@ -106,7 +100,7 @@ def run_nj_weighted(cm_uniq, prior_probs = None, verbose = True):
 
     cm_lookup = list(cm_uniq.apply(lambda x: "|".join(x.values), axis=1))
 
-    dm = compute_distance_mat(cm_uniq.values.astype(np.str), cm_uniq.shape[0], priors=prior_probs)
+    dm = compute_distance_mat(cm_uniq.values.astype(str), cm_uniq.shape[0], priors=prior_probs)
     
     ids = cm_uniq.index 
     dm = sp.spatial.distance.squareform(dm)
@@ -148,20 +142,14 @@ def run_camin_sokal(cm_uniq, stem, verbose = True):
 
 
     infile = stem + 'infile.txt'
-    fn = stem + "phylo.txt"
     weights_fn = stem + "weights.txt"
-    
-    cm_uniq.to_csv(fn, sep='\t')
 
-    script = (SCLT_PATH / 'TreeSolver' / 'binarize_multistate_charmat.py')
-    cmd =  "python3.6 " + str(script) +  " " + fn + " " + infile
-    p = subprocess.Popen(cmd, shell=True)
-    pid, ecode = os.waitpid(p.pid, 0)
+    write_binarized_charmat(cm_uniq, infile)
 
     weights = construct_weights(infile, weights_fn)
 
-    os.system("touch outfile")
-    os.system("touch outtree")
+    for f in ["outfile", "outtree"]:
+        open(f, "a").close()
 
     outfile = stem + 'outfile.txt'
     outtree = stem + 'outtree.txt'
@@ -221,12 +209,9 @@ def run_camin_sokal(cm_uniq, stem, verbose = True):
     state_tree = cs_net
     ret_tree =  Cassiopeia_Tree(method='camin-sokal', network=state_tree, name='Cassiopeia_state_tree')
 
-    os.system("rm " + outfile)
-    os.system("rm " + responses)
-    os.system("rm " + outtree)
-    os.system("rm " + consense_outfile)
-    os.system("rm " + infile)
-    os.system("rm " + fn)
+    for f in [outfile, responses, outtree, consense_outfile, infile]:
+        if os.path.exists(f):
+            os.remove(f)
 
     return ret_tree
 
@@ -253,6 +238,22 @@ def write_leaves_to_charmat(target_nodes, fn):
                 f.write("\t" + c)
             f.write("\n")
 
+def write_binarized_charmat(cm, out_fp, relaxed=False):
+    """
+    Helper function to write the character matrix CM as a binarized PHYLIP file to OUT_FP.
+    This runs the binarization in-process on the DataFrame, rather than writing CM out to a
+    TSV and re-reading it in a separate `binarize_multistate_charmat.py` process.
+    """
+
+    charmat = cm.reset_index()
+
+    state_map = multi_map(charmat)
+    strings, m = construct_file(charmat, state_map, relaxed=relaxed)
+
+    with open(out_fp, "w") as f:
+        f.write("\t" + str(charmat.shape[0]) + " " + str(m) + "\n")
+        f.writelines(strings)
+
 def pairwise_dist(s1, s2, priors=None):
     
     d = 0
@@ -287,22 +288,92 @@ def pairwise_dist(s1, s2, priors=None):
     
     return d / num_present
 
-@jit(parallel=True)
-def compute_distance_mat(cm, C, priors=None):
-        
-    dm = np.zeros(C * (C-1) // 2, dtype=float)
-    k = 0
-    for i in tqdm(range(C-1), desc = 'solving distance matrix'):
+def encode_character_matrix(cm, priors=None):
+    """
+    Helper function to integer-encode a string character matrix CM for the distance kernel.
+    Missing states ('-') are encoded as -1, the uncut state ('0') as 0 and every other state
+    of a character as 1..k. If PRIORS are given, also returns a (characters x max(k)+1) table
+    of the log prior probability of each encoded state.
+    """
+
+    codes = np.zeros(cm.shape, dtype=np.int64)
+    col_states = []
+    for c in range(cm.shape[1]):
+        uniq, inv = np.unique(cm[:, c], return_inverse=True)
+
+        lookup = np.zeros(len(uniq), dtype=np.int64)
+        states = []
+        for u in range(len(uniq)):
+            if uniq[u] == '-':
+                lookup[u] = -1
+            elif uniq[u] != '0':
+                states.append(uniq[u])
+                lookup[u] = len(states)
+
+        codes[:, c] = lookup[inv]
+        col_states.append(states)
+
+    log_priors = np.zeros((cm.shape[1], max([len(s) for s in col_states] + [0]) + 1))
+    if priors:
+        for c in range(len(col_states)):
+            for k in range(len(col_states[c])):
+                log_priors[c, k + 1] = np.log(priors[c][str(col_states[c][k])])
+
+    return codes, log_priors
+
+@njit(parallel=True)
+def _compute_distance_mat_kernel(codes, log_priors, weighted):
+
+    C, M = codes.shape
+    dm = np.zeros(C * (C-1) // 2, dtype=np.float64)
+    for i in prange(C-1):
+
+        # condensed index of the pair (i, i+1)
+        offset = i * C - (i * (i + 1)) // 2
+
         for j in range(i+1, C):
-            
-            s1 = cm[i,:]
-            s2 = cm[j,:]
-                
-            dm[k] = pairwise_dist(s1, s2, priors=priors)   
-            k += 1
-    
+
+            d = 0.0
+            num_present = 0
+            for c in range(M):
+                a, b = codes[i, c], codes[j, c]
+                if a < 0 or b < 0:
+                    continue
+
+                num_present += 1
+
+                if weighted:
+                    if a == b:
+                        if a != 0:
+                            d += log_priors[c, a]
+                    elif a == 0:
+                        d -= log_priors[c, b]
+                    elif b == 0:
+                        d -= log_priors[c, a]
+                    else:
+                        d -= (log_priors[c, a] + log_priors[c, b])
+                elif a != b:
+                    if a == 0 or b == 0:
+                        d += 1
+                    else:
+                        d += 2
+
+            if num_present > 0:
+                dm[offset + j - i - 1] = d / num_present
+
     return dm
 
+def compute_distance_mat(cm, C, priors=None):
+    """
+    Compute the condensed pairwise distance vector of the C samples in the string character
+    matrix CM, with the same scoring as `pairwise_dist`. The matrix is integer-encoded once
+    and all pairs are scored in a compiled, parallel kernel.
+    """
+
+    codes, log_priors = encode_character_matrix(cm[:C], priors=priors)
+
+    return _compute_distance_mat_kernel(codes, log_priors, bool(priors))
+
 def construct_weights(phy, weights_fn, write=True):
     """
     Given some binary phylip infile file path, compute the character-wise log frequencies
@@ -88,14 +88,17 @@ def set_progeny_size(G, root):
         G.nodes[n]['prog_size'])
     """
 
-    s = get_progeny_size(G, root)
-
-    G.nodes[root]["prog_size"] = s
-
-    for d in tqdm(G.nodes(), desc="Computing progeny size for each internal node"):
-
-        s = get_progeny_size(G, d)
-        G.nodes[d]["prog_size"] = s
+    # accumulate leaf counts bottom-up in a single post-order pass over all of G,
+    # instead of re-traversing the subtree below every node; every node is
+    # annotated, not only those below root
+    prog_size = {}
+    for n in nx.dfs_postorder_nodes(G):
+        if G.out_degree(n) == 0:
+            prog_size[n] = 1 if G.in_degree(n) == 1 else 0
+        else:
+            prog_size[n] = sum([prog_size[c] for c in G.successors(n)])
+
+    nx.set_node_attributes(G, prog_size, "prog_size")
 
     return G
 
@@ -347,7 +350,7 @@ def compute_mean_membership(G, metavals, depth=0):
 
     return np.mean(vote_prop), csq_table.shape[0]
 
-def assign_meta(G, meta):
+def assign_meta(G, meta, leaves=None):
     """
     Assign meta items to all leaves in G and store as a node attribute.
 
@@ -355,19 +358,20 @@ def assign_meta(G, meta):
         Input graph.
     :param meta:
         pandas Series of meta items, where the index are sample labels.
+    :param leaves:
+        Optional list of leaves of G. When assigning several meta items to the same tree, pass
+        these in to avoid re-scanning the graph for every item.
 
     :return:
         Graph with meta items assigned to leaves. 
     """
 
+    if leaves is None:
+        leaves = [x for x in G.nodes() if G.out_degree(x) == 0 and G.in_degree(x) == 1]
 
-    root = [node for node in G.nodes() if G.in_degree(node) == 0][0]
-
-    leaves = [x for x in G.nodes() if G.out_degree(x) == 0 and G.in_degree(x) == 1]
-    metadict = {}
-
-    for l in leaves:
-        G.nodes[l]['meta'] = meta.loc[l.name]
+    # look up all leaves in one pass rather than one label lookup per leaf
+    values = meta.loc[[l.name for l in leaves]].values
+    nx.set_node_attributes(G, dict(zip(leaves, values)), 'meta')
 
     return G
 
@@ -494,9 +498,11 @@ if __name__ == "__main__":
 
     G = set_progeny_size(G, root)
 
+    meta_leaves = [x for x in G.nodes() if G.out_degree(x) == 0 and G.in_degree(x) == 1]
+
     for i in tqdm(meta.columns, desc="Processing each meta item"):
         meta_vals = list(meta[i].unique())
-        G = assign_meta(G, meta[i])
+        G = assign_meta(G, meta[i], leaves=meta_leaves)
 
         chisq_stats = defaultdict(list)
         pvalues = defaultdict(list)
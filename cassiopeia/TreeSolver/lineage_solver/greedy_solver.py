@@ -1,4 +1,5 @@
 from collections import defaultdict
+import math
 import networkx as nx
 import numpy as np
 import hashlib
@@ -33,23 +34,22 @@ def find_split(
             if (str(i), char) not in considered:
                 # you can't split on a missing value or a 'None' state
                 if char != "0" and char != "-":
-                    if priors:
-                        character_mutation_mapping[(str(i), char)] -= np.log(
-                            priors[int(i)][char]
-                        )
-                    else:
-                        character_mutation_mapping[(str(i), char)] += 1
+                    character_mutation_mapping[(str(i), char)] += 1
+
+    # Weight each state's count by its negative log prior once per distinct
+    # (character, state), rather than once per node
+    if priors and character_mutation_mapping:
+        keys = list(character_mutation_mapping.keys())
+        counts = np.array([character_mutation_mapping[k] for k in keys], dtype=float)
+        probs = np.array([priors[int(i)][char] for i, char in keys], dtype=float)
+        character_mutation_mapping = defaultdict(
+            int, zip(keys, (counts * -np.log(probs)).tolist())
+        )
 
     # Choosing the best mutation to split on (ie character and state)
     character, state = 0, 0
     max_cost = 0
 
-    min_prior = 1
-    if priors:
-        for i in priors.keys():
-            for j in priors[i].keys():
-                min_prior = min(min_prior, priors[i][j])
-
     if probabilistic:
 
         entries, vals = (
@@ -472,15 +472,11 @@ def greedy_build(
             lookahead_depth,
         )
 
-        left_nodes = [
-            node for node in left_network.nodes() if left_network.in_degree(node) == 0
-        ]
+        left_hash = str(hashlib.md5(left_root.encode("utf-8")).hexdigest())
         dup_dict = {}
         for n in left_network:
-            if n in list(G.nodes()) and n != left_root:
-                dup_dict[n] = (
-                    n + "_" + str(hashlib.md5(left_root.encode("utf-8")).hexdigest())
-                )
+            if n in G and n != left_root:
+                dup_dict[n] = n + "_" + left_hash
         left_network = nx.relabel_nodes(left_network, dup_dict)
         G = nx.compose(G, left_network)
         if root != left_root:
@@ -503,24 +499,22 @@ def greedy_build(
         missing_data_mode,
         lookahead_depth,
     )
-    right_nodes = [
-        node for node in right_network.nodes() if right_network.in_degree(node) == 0
-    ]
     right_root = root_finder(right_split)
 
-    dup_dict = {}
+    # duplicated internal nodes are renamed in the right network and duplicated
+    # leaves in G; collect both renamings and relabel each graph once
+    right_hash = str(hashlib.md5(right_root.encode("utf-8")).hexdigest())
+    right_rename, G_rename = {}, {}
     for n in right_network:
-        if n in list(G.nodes()) and n != right_root:
-            dup_dict[n] = (
-                n + "_" + str(hashlib.md5(right_root.encode("utf-8")).hexdigest())
-            )
-    for n in dup_dict:
-        rename_dict = {n: dup_dict[n]}
-        if right_network.out_degree(n) != 0:
-            right_network = nx.relabel_nodes(right_network, rename_dict)
-        else:
-            rename_dict = {n: dup_dict[n]}
-            G = nx.relabel_nodes(G, rename_dict)
+        if n in G and n != right_root:
+            if right_network.out_degree(n) != 0:
+                right_rename[n] = n + "_" + right_hash
+            else:
+                G_rename[n] = n + "_" + right_hash
+    if right_rename:
+        right_network = nx.relabel_nodes(right_network, right_rename)
+    if G_rename:
+        G = nx.relabel_nodes(G, G_rename)
 
     G = nx.compose(G, right_network)
 
@@ -536,7 +530,7 @@ def greedy_build(
             G.add_edge(
                 splitter,
                 right_root,
-                weight=-np.log(priors[int(character)][state]),
+                weight=-math.log(priors[int(character)][state]),
                 label=str(character) + ": 0 -> " + str(state),
             )
 
@@ -559,7 +553,7 @@ def compute_entropy_of_split(cells):
         # convert counts to frequencies
         counts_per_state = dict([(k, v / N) for k, v in counts_per_state.items()])
 
-        ent = -1 * np.sum([p * np.log(p) for p in counts_per_state.values()])
+        ent = -1 * sum([p * math.log(p) for p in counts_per_state.values()])
         entropies.append(ent)
 
     return np.mean(entropies)
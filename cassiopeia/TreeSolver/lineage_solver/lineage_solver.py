@@ -420,8 +420,8 @@ def reraise_with_stack(func):
         try:
             return func(*args, **kwargs)
         except Exception as e:
-            traceback_str = traceback.format_exc(e)
-            raise StandardError(
+            traceback_str = traceback.format_exc()
+            raise Exception(
                 "Error occurred. Original traceback " "is\n%s\n" % traceback_str
             )
 
@@ -435,7 +435,7 @@ def prune_unique_alleles(root, targets):
     cp = pd.DataFrame(np.array([t.split("|") for t in targets]))
 
     # find unique indels
-    counts = cp.apply(lambda x: np.unique(x, return_counts=True), axis=0).values
+    counts = [np.unique(cp[col].values, return_counts=True) for col in cp.columns]
     unique_alleles = list(
         map(
             lambda x: x[0][np.where(x[1] == 1)]
@@ -1,3 +1,4 @@
+import math
 import networkx as nx
 import numpy as np
 from collections import OrderedDict
@@ -67,7 +68,7 @@ def get_edge_length(x,y,priors=None, weighted=False):
 				if not weighted:
 					count += 1
 				else:
-					count += -np.log(priors[i][str(y_list[i])])
+					count += -math.log(priors[i][str(y_list[i])])
 			else:
 				return -1
 	return count
@@ -166,7 +167,9 @@ def build_potential_graph_from_base_graph(samples, root, max_neighborhood_size =
 				print("Max Neighborhood Exceeded, Returning Network (pid: " + str(pid) + ")")
 				return prev_network, max_neighbor_dist - 1, potential_graph_diagnostic
 
-			temp_source_nodes = list()
+			# parents are collected in a set so that the neighborhood size can be checked
+			# after every sample without re-sorting all parents found so far
+			temp_source_nodes = set()
 			for i in range(0, len(source_nodes)-1):
 				sample = source_nodes[i]
 				top_parents = []
@@ -194,7 +197,7 @@ def build_potential_graph_from_base_graph(samples, root, max_neighborhood_size =
 
 							initial_network.add_edge(parent, sample_2, weight=edge_length_p_s2_priors, label=muts_to_s2[(parent, sample_2)])
 							initial_network.add_edge(parent, sample, weight=edge_length_p_s1_priors, label=muts_to_s1[(parent, sample)])
-							temp_source_nodes.append(parent)
+							temp_source_nodes.add(parent)
 
 							p_to_s1_lengths[(parent, sample)] = edge_length_p_s1_priors
 							p_to_s2_lengths[(parent, sample_2)] = edge_length_p_s2_priors
@@ -205,12 +208,13 @@ def build_potential_graph_from_base_graph(samples, root, max_neighborhood_size =
 				for parent, sample_2 in lst:
 					initial_network.add_edge(parent, sample_2, weight=p_to_s2_lengths[(parent, sample_2)], label=muts_to_s2[(parent, sample_2)])
 					initial_network.add_edge(parent, sample, weight=p_to_s1_lengths[(parent, sample)], label=muts_to_s1[(parent, sample)])
-					temp_source_nodes.append(parent)
+					temp_source_nodes.add(parent)
 
-				temp_source_nodes = list(np.unique(temp_source_nodes))
 				if len(temp_source_nodes) > int(max_neighborhood_size) and prev_network != None:
 					return prev_network, max_neighbor_dist - 1, potential_graph_diagnostic
 
+			temp_source_nodes = list(np.unique(list(temp_source_nodes)))
+
 			if len(source_nodes) > len(temp_source_nodes):
 				if neighbor_mod == max_neighbor_dist:
 					neighbor_mod *= 3
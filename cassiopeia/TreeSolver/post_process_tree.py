@@ -34,28 +34,15 @@ def prune_and_clean_leaves(G):
     new_edges = []
 
 
-    def prune_leaves(G):
+    # a node is pruned if it is not a target and everything below it is pruned
+    # (i.e. it would eventually become a non-target leaf); resolve this in one
+    # post-order pass and remove all such nodes at once
+    pruned = set()
+    for n in nx.dfs_postorder_nodes(G):
+        if not n.is_target and all(c in pruned for c in G.successors(n)):
+            pruned.add(n)
 
-        nodes_to_remove = []
-
-        root = [n for n in G if G.in_degree(n) == 0][0]
-
-        # first remove paths to leaves that don't correspond to samples
-        _leaves = [n for n in G if G.out_degree(n) == 0]
-
-        for n in _leaves:
-            # we detect leaves that are not targets by the `is_target` attribute.
-            if not n.is_target:
-                nodes_to_remove.append(n)
-
-        return nodes_to_remove
-
-    nodes_to_remove = prune_leaves(G)
-    while len(nodes_to_remove) > 0:
-        for n in set(nodes_to_remove):
-            G.remove_node(n)
-
-        nodes_to_remove = prune_leaves(G)
+    G.remove_nodes_from(pruned)
 
     # remove character strings from node name
     # node_dict = {}
@@ -118,15 +105,19 @@ def assign_samples_to_charstrings(G, cm):
     if 'lookup' not in cm.columns:
         cm["lookup"] = cm.astype(str).apply(lambda x: "|".join(x), axis=1)
 
+    # group samples by character string once, rather than masking the whole
+    # character matrix for every node in the tree
+    char_vals = cm.values[:, :-1] # make sure to do up to [:-1] b/c you don't want the lookup in your character vec
+    samples_by_lookup = defaultdict(list)
+    for i, lookup in enumerate(cm["lookup"].values):
+        samples_by_lookup[lookup].append(i)
+
     for n in G:
 
-        if n.get_character_string() in cm['lookup'].values and n.is_target:
+        if n.is_target and n.get_character_string() in samples_by_lookup:
             n.is_target = False
-            sub_cm  = cm.loc[cm["lookup"] == n.get_character_string()]
-            _nodes = sub_cm.apply(lambda x: Node(x.name, x.values[:-1], is_target=True), axis=1) # make sure to do up to [:-1] b/c you don't want the lookup in your character vec
-            if len(_nodes) == 0:
-                continue
-            for new_node in _nodes:
+            for i in samples_by_lookup[n.get_character_string()]:
+                new_node = Node(cm.index[i], char_vals[i], is_target=True)
                 new_nodes.append(new_node)
                 new_edges.append((n, new_node))
 
@@ -142,17 +133,18 @@ def tree_collapse(graph):
         :return: Collapsed tree as a Networkx object
     """
 
-    new_network = nx.DiGraph()
+    # collect the collapsed edges and build the graph in one shot
+    new_edges = []
     for edge in graph.edges():
         if edge[0].split('_')[0] == edge[1].split('_')[0]:
             if graph.out_degree(edge[1]) != 0:
                 for node in graph.successors(edge[1]):
-                    new_network.add_edge(edge[0], node)
+                    new_edges.append((edge[0], node))
             else:
-                new_network.add_edge(edge[0], edge[1])
+                new_edges.append((edge[0], edge[1]))
         else:
-            new_network.add_edge(edge[0], edge[1])
-    return new_network
+            new_edges.append((edge[0], edge[1]))
+    return nx.DiGraph(new_edges)
 
 def add_redundant_leaves(G, cm):
     """
@@ -183,21 +175,31 @@ def add_redundant_leaves(G, cm):
     #nonuniq = np.setdiff1d(cm.index, np.array(uniq))
     nonuniq = np.setdiff1d(cm.index, uniq.index)
 
+    # map each character string to the first sample carrying it in the tree,
+    # and each sample to its row, once up front
+    leaf_by_lookup = {}
+    for name, lookup in zip(uniq.index, uniq["lookup"].values):
+        leaf_by_lookup.setdefault(lookup, name)
+    lookup_of = dict(zip(cm.index, cm["lookup"].values))
+    cm_rows = dict(zip(cm.index, cm.values))
+
+    new_edges = []
     for n in nonuniq:
 
         new_node = str(n)
 
         try:
-            _leaf = uniq.index[uniq["lookup"] == cm.loc[n]["lookup"]][0]
+            _leaf = leaf_by_lookup[lookup_of[n]]
 
-            new_node = Node(str(n), cm.loc[n].values, is_target=True)
+            new_node = Node(str(n), cm_rows[n], is_target=True)
 
             parents = list(G.predecessors(_leaf))
             for p in parents:
-                G.add_edge(p, new_node)
+                new_edges.append((p, new_node))
         except:
             continue
 
+    G.add_edges_from(new_edges)
 
     return G
 
@@ -42,66 +42,13 @@ from cassiopeia.TreeSolver.utilities import (
 
 from cassiopeia.TreeSolver.Cassiopeia_Tree import Cassiopeia_Tree
 from cassiopeia.TreeSolver.Node import Node
-
-from numba import jit
+from cassiopeia.TreeSolver.alternative_algorithms import compute_distance_mat
 
 import cassiopeia as sclt
 
 SCLT_PATH = Path(sclt.__path__[0])
 
 
-@jit(parallel=True)
-def compute_distance_mat(cm, C, priors=None):
-
-    dm = np.zeros(C * (C - 1) // 2, dtype=float)
-    k = 0
-    for i in range(C - 1):
-        for j in range(i + 1, C):
-
-            s1 = cm[i]
-            s2 = cm[j]
-
-            dm[k] = pairwise_dist(s1, s2, priors)
-            k += 1
-
-    return dm
-
-
-def pairwise_dist(s1, s2, priors=None):
-
-    d = 0
-    num_present = 0
-    for i in range(len(s1)):
-
-        if s1[i] == "-" or s2[i] == "-":
-            continue
-
-        num_present += 1
-
-        if priors:
-            if s1[i] == s2[i]:
-                d += np.log(priors[i][str(s1[i])])
-
-        if s1[i] != s2[i]:
-            if s1[i] == "0" or s2[i] == "0":
-                if priors:
-                    if s1[i] != "0":
-                        d -= np.log(priors[i][str(s1[i])])
-                    else:
-                        d -= np.log(priors[i][str(s2[i])])
-                else:
-                    d += 1
-            else:
-                if priors:
-                    d -= np.log(priors[i][str(s1[i])]) + np.log(priors[i][str(s2[i])])
-                else:
-                    d += 2
-    if num_present == 0:
-        return 0
-
-    return d / num_present
-
-
 def write_leaves_to_charmat(target_nodes, fn):
     """
     Helper function to write TARGET_NODES to a character matrix to conver to multistate;
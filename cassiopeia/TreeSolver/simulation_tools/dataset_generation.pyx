@@ -3,7 +3,7 @@ import numpy as np
 import random
 from tqdm import tqdm
 
-from simulation_utils import node_to_string, get_leaves_of_tree
+from simulation_utils import get_leaves_of_tree
 from cassiopeia.TreeSolver.Node import Node
 from cassiopeia.TreeSolver.Cassiopeia_Tree import Cassiopeia_Tree
 
@@ -46,45 +46,72 @@ def generate_simulated_full_tree(
 		A networkx tree of samples
 	"""
 
-    network = nx.DiGraph()
-    current_depth = [[["0" for _ in range(0, characters)], "0"]]
-    network.add_node(node_to_string(current_depth[0]))
-    uniq = 1
+    # per-character mutation tables, so that a whole generation can be mutated
+    # with one vectorized draw instead of one np.random.choice per cell and character
+    mutation_values, mutation_cdfs = [], []
+    for c in range(0, characters):
+        values, probabilities = zip(*mutation_prob_map[c].items())
+        mutation_values.append(np.array(values, dtype=object))
+        mutation_cdfs.append(np.cumsum(probabilities))
+    dropout_probs = np.array([variable_dropout_prob_map[c] for c in range(0, characters)])
+
+    # the tree is stored compactly as one state array per generation; the parent of
+    # cell j in a generation is cell j // 2 of the previous one, so no graph is
+    # needed until the surviving cells are materialized at the end
+    current_states = np.full((1, characters), "0", dtype=object)
+    generations = [current_states]
     for i in range(0, depth):
-        temp_current_depth = []
-        for node in current_depth:
-            for _ in range(0, 2):
-                child_node = simulate_mutation(node[0], mutation_prob_map)
-                if i == depth - 1 and dropout:
-                    child_node = simulate_dropout(child_node, variable_dropout_prob_map)
-                temp_current_depth.append([child_node, uniq])
-                network.add_edge(
-                    node_to_string(node), node_to_string([child_node, str(uniq)])
-                )
-                uniq += 1
 
-        current_depth = temp_current_depth
+        # every cell divides into two children which inherit the parent's states
+        child_states = np.repeat(current_states, 2, axis=0)
 
-    subsampled_population_for_removal = random.sample(
-        current_depth, int((1 - subsample_percentage) * len(current_depth))
-    )
+        draws = np.random.random(child_states.shape)
+        for c in range(0, characters):
+            unmutated = child_states[:, c] == "0"
+            idx = np.searchsorted(mutation_cdfs[c], draws[unmutated, c], side="right")
+            child_states[unmutated, c] = mutation_values[c][
+                np.minimum(idx, len(mutation_values[c]) - 1)
+            ]
 
-    for node in subsampled_population_for_removal:
-        network.remove_node(node_to_string(node))
+        if i == depth - 1 and dropout:
+            child_states[np.random.random(child_states.shape) <= dropout_probs] = "-"
 
-    rdict = {}
-    i = 0
-    for n in network.nodes:
-        nn = Node(
-            "StateNode" + str(i),
-            n.split("_")[0].split("|"),
-            pid=n.split("_")[1],
-            is_target=False,
-        )
-        i += 1
-        rdict[n] = nn
+        generations.append(child_states)
+        current_states = child_states
 
-    state_tree = nx.relabel_nodes(network, rdict)
+    # dropout draws from np.random rather than the random module, so for a fixed
+    # random.seed the cells removed here differ from the original per-cell simulation
+    subsampled_population_for_removal = random.sample(
+        range(len(current_states)), int((1 - subsample_percentage) * len(current_states))
+    )
+    keep_leaf = np.ones(len(current_states), dtype=bool)
+    keep_leaf[subsampled_population_for_removal] = False
+
+    nodes, edges = [], []
+    prev_nodes = None
+    uniq = 0
+    for g in range(len(generations)):
+        gen_nodes = [None] * len(generations[g])
+        for j in range(len(generations[g])):
+            if g == len(generations) - 1 and not keep_leaf[j]:
+                continue
+
+            gen_nodes[j] = Node(
+                "StateNode" + str(len(nodes)),
+                generations[g][j],
+                pid=str(uniq + j),
+                is_target=False,
+            )
+            nodes.append(gen_nodes[j])
+            if g > 0:
+                edges.append((prev_nodes[j // 2], gen_nodes[j]))
+
+        uniq += len(generations[g])
+        prev_nodes = gen_nodes
+
+    state_tree = nx.DiGraph()
+    state_tree.add_nodes_from(nodes)
+    state_tree.add_edges_from(edges)
 
     state_tree = Cassiopeia_Tree("simulated", network=state_tree)
 
@@ -110,19 +137,29 @@ def generate_simulated_experiment_plasticity(
 
     n_transitions = 0
 
+    # node meta labels and edges are accumulated in plain python containers and
+    # written to the graph once the simulation completes
+    meta = {}
+    edges = []
+
     network = nx.DiGraph()
     current_depth = [Node('state-node', character_vec=["0" for _ in range(0, characters)])]
     # current_depth = [[["0" for _ in range(0, characters)], "0"]]
     network.add_node(current_depth[0])
-    network.node[current_depth[0]]["meta"] = np.random.choice(sample_list)
+    meta[current_depth[0]] = np.random.choice(sample_list)
     uniq = 1
 
     for i in tqdm(range(0, depth), desc="Generating cells at each level in tree"):
         temp_current_depth = []
-        for node in current_depth:
 
-            if np.random.random() < alpha:
-                for _ in range(0, 2):
+        # draw division and meta transition events for every cell at this level at once
+        divides = np.random.random(len(current_depth)) < alpha
+        transitions = np.random.random((len(current_depth), 2)) < mu
+
+        for node, divide, transition in zip(current_depth, divides, transitions):
+
+            if divide:
+                for k in range(0, 2):
                     child_node = simulate_mutation(node.char_vec, mutation_prob_map)
                     if i == depth - 1:
                         child_node = simulate_dropout(child_node, variable_dropout_prob_map)
@@ -130,27 +167,25 @@ def generate_simulated_experiment_plasticity(
                     child_node = Node('state-node', character_vec = child_node)
 
                     temp_current_depth.append(child_node)
-                    network.add_edge(
-                        node, child_node
-                    )
+                    edges.append((node, child_node))
 
-                    if np.random.random() < mu:
+                    if transition[k]:
 
                         if transition_matrix is None:
                             temp_sample_list = sample_list.copy()
-                            temp_sample_list.remove(network.node[node]['meta'])
+                            temp_sample_list.remove(meta[node])
                             trans = np.random.choice(temp_sample_list)
-                            network.node[child_node]['meta'] = trans
+                            meta[child_node] = trans
                             n_transitions += 1
                         else:
-                            curr_meta = network.node[node]['meta']
+                            curr_meta = meta[node]
                             probs = transition_matrix.loc[curr_meta].values
                             trans = np.random.choice(transition_matrix.columns, p = probs)
-                            network.node[child_node]['meta'] = trans
+                            meta[child_node] = trans
                             n_transitions += 1
 
                     else: 
-                        network.node[child_node]['meta'] = network.node[node]['meta']
+                        meta[child_node] = meta[node]
                 
                     uniq += 1
             else:
@@ -158,6 +193,9 @@ def generate_simulated_experiment_plasticity(
                 
         current_depth = temp_current_depth
 
+    network.add_edges_from(edges)
+    nx.set_node_attributes(network, meta, "meta")
+
     # rename nodes for easy lookup later 
     i = 0
     for n in network.nodes:
@@ -182,36 +220,38 @@ def overlay_markov_chain(tree,
     root = [n for n in tree if tree.in_degree(n) == 0][0]
     
     # pre-process tree such that only leaves are 
-    max_depth = max(nx.shortest_path_length(tree, root, node) for node in tree.nodes())
     shortest_paths = nx.shortest_path_length(tree, root)
-    
-    _leaves = [n for n in tree if tree.out_degree(n) == 0]
-    for l in _leaves:
-
-        if shortest_paths[l] < max_depth:
-            
-            n = l
-            while tree.out_degree(n) < 1:
-                parent = list(tree.predecessors(n))[0]
-                tree.remove_node(n)
-                n = parent
+    max_depth = max(shortest_paths.values())
+
+    # keep only the leaves at the maximum depth and their ancestors, removing
+    # everything else in one batch
+    keep = set([n for n in tree if tree.out_degree(n) == 0 and shortest_paths[n] == max_depth])
+    stack = list(keep)
+    while len(stack) > 0:
+        n = stack.pop()
+        for parent in tree.predecessors(n):
+            if parent not in keep:
+                keep.add(parent)
+                stack.append(parent)
+
+    tree.remove_nodes_from([n for n in tree if n not in keep])
                     
     n_transitions = 0
     
-    tree.node[root]["meta"] = np.random.choice(sample_list)
+    tree.nodes[root]["meta"] = np.random.choice(sample_list)
     
     for e in nx.dfs_edges(tree, source=root):
         
         if np.random.random() < mu:
             
             temp_sample_list = sample_list.copy()
-            temp_sample_list.remove(tree.node[e[0]]['meta'])
+            temp_sample_list.remove(tree.nodes[e[0]]['meta'])
             trans = np.random.choice(temp_sample_list)
-            tree.node[e[1]]['meta'] = trans
+            tree.nodes[e[1]]['meta'] = trans
             
             n_transitions += 1
         else:
-            tree.node[e[1]]['meta'] = tree.node[e[0]]['meta']
+            tree.nodes[e[1]]['meta'] = tree.nodes[e[0]]['meta']
             
     
     # relabel nodes
@@ -240,9 +280,10 @@ def simulate_dropout(sample, variable_dropout_probability_map):
 	:return:
 		A sample with characters potential dropped out (Dropped out characters in the form '-')
 	"""
+    draws = np.random.random(len(sample))
     new_sample = []
     for i in range(0, len(sample)):
-        if random.uniform(0, 1) <= variable_dropout_probability_map[i]:
+        if draws[i] <= variable_dropout_probability_map[i]:
             new_sample.append("-")
         else:
             new_sample.append(sample[i])
@@ -264,13 +305,16 @@ def simulate_mutation(sample, mutation_prob_map):
 	:return:
 		A sample with characters potential mutated
 	"""
+    # draw the uniforms for all characters at once and invert each character's
+    # cumulative distribution, rather than one np.random.choice call per character
+    draws = np.random.random(len(sample))
     new_sample = []
     for i in range(0, len(sample)):
         character = sample[i]
         if character == "0":
             values, probabilities = zip(*mutation_prob_map[i].items())
-            new_character = np.random.choice(values, p=probabilities)
-            new_sample.append(new_character)
+            idx = np.searchsorted(np.cumsum(probabilities), draws[i], side="right")
+            new_sample.append(values[min(idx, len(values) - 1)])
         else:
             new_sample.append(character)
     return new_sample
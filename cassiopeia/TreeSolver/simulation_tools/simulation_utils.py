@@ -28,8 +28,9 @@ def get_leaves_of_tree(tree):
 
 	source = [x for x in tree.nodes() if tree.in_degree(x)==0][0]
 
-	max_depth = max(nx.shortest_path_length(tree,source,node) for node in tree.nodes())
+	# one BFS from the source gives every depth, and hence the maximum depth
 	shortest_paths = nx.shortest_path_length(tree,source)
+	max_depth = max(shortest_paths.values())
 
 	#if clip_identifier:
 	#	return [x[:x.index('_')] for x in tree.nodes() if tree.out_degree(x)==0 and tree.in_degree(x)==1 and shortest_paths[x] == max_depth]
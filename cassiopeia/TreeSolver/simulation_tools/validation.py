@@ -26,7 +26,7 @@ def check_triplets_correct(simulated_tree, reconstructed_tree, number_of_trials=
 	"""
 
 	success_rate = 0
-	targets_original_network = [n for n in get_leaves_of_tree(simulated_tree.network)]
+	targets_original_network = list(get_leaves_of_tree(simulated_tree.network))
 	# targets_original_network = [n for n in simulated_tree.get_leaves()]
 	correct_classifications = defaultdict(int)
 	frequency_of_triplets = defaultdict(int)
@@ -1,4 +1,5 @@
 from collections import defaultdict, OrderedDict
+import itertools
 import networkx as nx
 import random
 import numpy as np
@@ -38,30 +39,22 @@ def tree_collapse(tree):
 
     new_graph = nx.relabel_nodes(graph, new)
 
+    # a single post-order pass resolves every node after its children, instead of
+    # sweeping over the whole graph until all nodes have been resolved
     dct = defaultdict(str)
-    while len(dct) != len(new_graph.nodes()):
-        for node in new_graph:
-            if "|" in node:
-                dct[node] = node
-            else:
-                succ = list(new_graph.successors(node))
-                if len(succ) == 1:
-                    if "|" in succ[0]:
-                        dct[node] = succ[0]
-                    elif "|" in dct[succ[0]]:
-                        dct[node] = dct[succ[0]]
-                else:
-                    if "|" in succ[0] and "|" in succ[1]:
-                        dct[node] = node_parent(succ[0], succ[1])
-                    elif "|" in dct[succ[0]] and "|" in succ[1]:
-                        dct[node] = node_parent(dct[succ[0]], succ[1])
-                    elif "|" in succ[0] and "|" in dct[succ[1]]:
-                        dct[node] = node_parent(succ[0], dct[succ[1]])
-                    elif "|" in dct[succ[0]] and "|" in dct[succ[1]]:
-                        dct[node] = node_parent(dct[succ[0]], dct[succ[1]])
+    for node in nx.dfs_postorder_nodes(new_graph):
+        if "|" in node:
+            dct[node] = node
+        else:
+            succ = [s if "|" in s else dct[s] for s in new_graph.successors(node)]
+            if len(succ) == 1:
+                if "|" in succ[0]:
+                    dct[node] = succ[0]
+            elif "|" in succ[0] and "|" in succ[1]:
+                dct[node] = node_parent(succ[0], succ[1])
 
     new_graph = nx.relabel_nodes(new_graph, dct)
-    new_graph.remove_edges_from(new_graph.selfloop_edges())
+    new_graph.remove_edges_from(list(nx.selfloop_edges(new_graph)))
 
     final_dct = {}
     for n in new_graph:
@@ -90,83 +83,66 @@ def tree_collapse2(tree):
     else:
         graph = tree.get_network()
 
-    leaves = [n for n in graph if graph.out_degree(n) == 0]
-    for l in leaves:
-
-        # traverse up beginning at leaf
-        parent = list(graph.predecessors(l))[0]
-        pair = (parent, l)
-
-        root = [n for n in graph if graph.in_degree(n) == 0][
-            0
-        ]  # need to reinstantiate root, in case we reassigned it
-
-        is_root = False
-        while not is_root:
-
-            u, v = pair[0], pair[1]
-            if u == root:
-                is_root = True
-
-            if u.get_character_string() == v.get_character_string():
-
-                # replace u with v
-                children_of_parent = graph.successors(u)
+    order = list(nx.topological_sort(graph))
+    char_strings = dict(
+        zip(order, [n.get_character_string() for n in order])
+    )
 
-                if not is_root:
-                    new_parent = list(graph.predecessors(u))[0]
+    # bottom-up: every node adopts the representative of its first child that
+    # carries the same character string, so each group of nodes joined by
+    # mutation-free edges is represented by one of its lowest nodes
+    rep = {}
+    for n in reversed(order):
+        rep[n] = n
+        for c in graph.successors(n):
+            if char_strings[c] == char_strings[n]:
+                rep[n] = rep[c]
+                break
 
-                graph.remove_node(u)  # removes parent node
-                for c in children_of_parent:
-                    if c != v:
-                        graph.add_edge(v, c)
+    # top-down: propagate the representative of the top of each group
+    for n in order:
+        for p in graph.predecessors(n):
+            if char_strings[p] == char_strings[n]:
+                rep[n] = rep[p]
 
-                if not is_root:
-                    graph.add_edge(new_parent, v)
-                    pair = (new_parent, v)
+    new_edges = [(rep[u], rep[v]) for u, v in graph.edges() if rep[u] != rep[v]]
 
-            else:
-                if not is_root:
-                    pair = (list(graph.predecessors(u))[0], u)
+    graph.remove_nodes_from([n for n in order if rep[n] != n])
+    graph.add_edges_from(new_edges)
 
     return graph
 
 
 def find_parent(node_list):
-    parent = []
     if isinstance(node_list[0], Node):
         node_list = [n.get_character_string() for n in node_list]
 
-    num_char = len(node_list[0].split("|"))
-    for x in range(num_char):
-        inherited = True
-
-        state = node_list[0].split("|")[x]
-        for n in node_list:
-            if n.split("|")[x] != state:
-                inherited = False
-
-        if not inherited:
-            parent.append("0")
-
-        else:
-            parent.append(state)
+    # split each child once into a (children x characters) array; a state is
+    # inherited only where every child agrees with the first
+    char_vecs = np.array([n.split("|") for n in node_list])
+    inherited = np.all(char_vecs == char_vecs[0], axis=0)
+    parent = np.where(inherited, char_vecs[0], "0")
 
     return Node("state-node", parent, is_target=False)
 
 
 def fill_in_tree(tree, cm=None):
 
+    # map sample names to their character rows once, rather than scanning the
+    # index and doing a .loc lookup for every node
+    if cm is not None:
+        cm_rows = dict(zip(cm.index, cm.values.tolist()))
+
     # rename samples to character strings
     rndct = {}
     for n in tree.nodes:
         if cm is None:
             rndct[n] = Node(n.name, n.char_string.split("|"), is_target=n.is_target)
         else:
-            if n.name in cm.index.values:
+            if n.name in cm_rows:
                 rndct[n] = Node(
                     "state-node",
-                    [str(k) for k in cm.loc[n.name].values],
+                    [str(k) for k in cm_rows[n.name]],
                     is_target=True,
                 )
             else:
@@ -179,7 +155,7 @@ def fill_in_tree(tree, cm=None):
     # run dfs and reconstruct states
     anc_dct = {}
     for n in tqdm(
-        nx.dfs_postorder_nodes(tree, root), total=len([n for n in tree.nodes])
+        nx.dfs_postorder_nodes(tree, root), total=len(tree)
     ):
         if "|" not in n.char_string or len(n.char_string) == 0:
             children = list(tree[n].keys())
@@ -190,7 +166,7 @@ def fill_in_tree(tree, cm=None):
 
     tree = nx.relabel_nodes(tree, anc_dct)
 
-    tree.remove_edges_from(tree.selfloop_edges())
+    tree.remove_edges_from(list(nx.selfloop_edges(tree)))
 
     return tree
 
@@ -222,8 +198,11 @@ def find_consensus_tree(trees, character_matrix, cutoff=0.5):
     consensus = majority_rule(_trees, cutoff=cutoff)[0]
     G = nx.DiGraph()
 
-    # Create dict from scikit bio TreeNode to cassiopeia.Node
+    # Create dict from scikit bio TreeNode to cassiopeia.Node; in a postorder
+    # walk the children are already converted, so edges are collected in the
+    # same pass and the graph is built in bulk
     e2cass = {}
+    edges = []
     for n in consensus.postorder():
         if n.name is not None:
             nn = Node(
@@ -236,16 +215,10 @@ def find_consensus_tree(trees, character_matrix, cutoff=0.5):
             nn = Node("state-node", [], support=n.support)
 
         e2cass[n] = nn
-        G.add_node(nn)
+        edges.extend([(nn, e2cass[c]) for c in n.children])
 
-    for p in consensus.traverse("postorder"):
-
-        pn = e2cass[p]
-
-        for c in p.children:
-            cn = e2cass[c]
-
-            G.add_edge(pn, cn)
+    G.add_nodes_from(e2cass.values())
+    G.add_edges_from(edges)
 
     return G
 
@@ -254,6 +227,11 @@ def get_modified_hamming_dist(n1, n2):
 
     x_list, y_list = n1.split("_")[0].split("|"), n2.split("_")[0].split("|")
 
+    return get_modified_hamming_dist_from_vecs(x_list, y_list)
+
+
+def get_modified_hamming_dist_from_vecs(x_list, y_list):
+
     count = 0
     for i in range(0, len(x_list)):
 
@@ -276,41 +254,84 @@ def get_modified_hamming_dist(n1, n2):
 
 def compute_pairwise_edit_dists(nodes, verbose=True):
 
-    edit_dist = []
     _leaves = nodes
+    n = len(_leaves)
 
-    all_pairs = []
-    for i1 in tqdm(range(len(_leaves)), desc="Creating pairs to compare"):
-        l1 = _leaves[i1]
-        for i2 in range(i1 + 1, len(_leaves)):
-            l2 = _leaves[i2]
+    # split every node's character string once and fill a preallocated condensed
+    # distance vector, rather than materializing a list of all O(N^2) pairs
+    char_vecs = [l.split("_")[0].split("|") for l in _leaves]
 
-            all_pairs.append((l1, l2))
+    # distances are bounded by 2 per character, so a compact integer type
+    # (int16 for any realistic number of characters) is exact
+    max_dist = 2 * max([len(v) for v in char_vecs] + [0])
+    dtype = np.int16 if max_dist <= np.iinfo(np.int16).max else np.int32
+    edit_dist = np.zeros(n * (n - 1) // 2, dtype=dtype)
 
-    for p in tqdm(all_pairs, desc="Computing modified hamming distances"):
+    k = 0
+    for i1 in tqdm(range(n), desc="Computing modified hamming distances"):
+        x_list = char_vecs[i1]
+        for i2 in range(i1 + 1, n):
+            edit_dist[k] = get_modified_hamming_dist_from_vecs(x_list, char_vecs[i2])
+            k += 1
 
-        edit_dist.append(get_modified_hamming_dist(p[0], p[1]))
+    return edit_dist, itertools.combinations(_leaves, 2)
 
-    return np.array(edit_dist), all_pairs
 
+def condensed_rows(condensed, N, rows):
+    """
+    Gathers full rows of the square distance matrix directly from its condensed (upper
+    triangular) form, without materializing the N x N matrix.
+
+    :param condensed:
+        Condensed distance vector of length N * (N - 1) / 2, as from `compute_pairwise_edit_dists`
+    :param N:
+        Number of samples
+    :param rows:
+        Array of row indices to gather
+    :return:
+        A len(rows) x N array of distances, with zeros on the diagonal
+    """
 
-def find_neighbors(target_nodes, n_neighbors=10):
+    i = np.asarray(rows)[:, None]
+    j = np.arange(N)[None, :]
+    a, b = np.minimum(i, j), np.maximum(i, j)
+
+    # condensed offset of pair (a, b) with a < b; the diagonal is masked below
+    idx = a * N - (a * (a + 1)) // 2 + b - a - 1
+    block = condensed[np.where(a == b, 0, idx)]
+    block[a == b] = 0
+
+    return block
+
+
+def find_neighbors(target_nodes, n_neighbors=10, block_size=1024):
 
     edit_dists, all_pairs = compute_pairwise_edit_dists(target_nodes)
-    ds = sp.spatial.distance.squareform(edit_dists)
 
-    sample_range = np.arange(ds.shape[0])[:, None]
-    indices = np.argpartition(ds, n_neighbors - 1, axis=1)[:, :n_neighbors]
-    indices = indices[sample_range, np.argsort(ds[sample_range, indices])]
-    distances = ds[sample_range, indices]
+    # select neighbors a block of rows at a time, gathered straight from the
+    # condensed distances, so neither the N x N distance matrix nor a full
+    # N x N argpartition index array is ever materialized
+    N = len(target_nodes)
+    indices = np.empty((N, n_neighbors), dtype=np.intp)
+    distances = np.empty((N, n_neighbors), dtype=edit_dists.dtype)
+    for start in range(0, N, block_size):
+        block = condensed_rows(edit_dists, N, np.arange(start, min(start + block_size, N)))
+        block_range = np.arange(block.shape[0])[:, None]
 
-    # create neighbors dict
+        inds = np.argpartition(block, n_neighbors - 1, axis=1)[:, :n_neighbors]
+        inds = inds[block_range, np.argsort(block[block_range, inds], axis=1)]
+
+        indices[start : start + block.shape[0]] = inds
+        distances[start : start + block.shape[0]] = block[block_range, inds]
+
+    # create neighbors dict; distances are handed out as python ints so the
+    # compact storage dtype does not leak into callers' arithmetic
     neighbors = {}
     dists = {}
     for i, inds in zip(range(len(indices)), indices):
         n = target_nodes[i]
         neighbors[n] = [target_nodes[j] for j in inds]
-        dists[n] = [d for d in distances[i]]
+        dists[n] = distances[i].tolist()
 
     return neighbors, dists
 
@@ -412,37 +433,37 @@ def convert_network_to_newick_format(graph, use_intermediate_names=True):
 	:return: String in newick format representing the above graph
 	"""
 
-    def _to_newick_str(g, node):
-        is_leaf = g.out_degree(node) == 0
+    def _get_name(node):
         if node.name == "internal" or node.name == "state-node":
-            _name = node.get_character_string()
-        else:
-            _name = node.name
-
-        if use_intermediate_names:
-            return (
-                "%s" % (_name,)
-                if is_leaf
-                else (
-                    "("
-                    + ",".join(_to_newick_str(g, child) for child in g.successors(node))
-                    + ")"
-                    + _name
-                )
-            )
+            return node.get_character_string()
+        return node.name
+
+    def to_newick_str(g, root):
+        # iterative depth-first traversal that collects string pieces in a list and
+        # joins them once, rather than concatenating the string of every subtree
+        # at each level of recursion
+        tokens = []
+        stack = [root]
+        while len(stack) > 0:
+            item = stack.pop()
+            if isinstance(item, str):
+                tokens.append(item)
+                continue
 
-        return (
-            "%s" % (_name,) + ":1"
-            if is_leaf
-            else (
-                "("
-                + ",".join(_to_newick_str(g, child) for child in g.successors(node))
-                + ")"
-            )
-        )
+            _name = "%s" % (_get_name(item),)
+            if g.out_degree(item) == 0:
+                tokens.append(_name if use_intermediate_names else _name + ":1")
+                continue
 
-    def to_newick_str(g, root=0):  # 0 assumed to be the root
-        return _to_newick_str(g, root) + ";"
+            tokens.append("(")
+            stack.append(")" + _name if use_intermediate_names else ")")
+            children = list(g.successors(item))
+            for j in range(len(children) - 1, -1, -1):
+                stack.append(children[j])
+                if j > 0:
+                    stack.append(",")
+
+        return "".join(tokens) + ";"
 
     return to_newick_str(
         graph, [node for node in graph if graph.in_degree(node) == 0][0]
@@ -468,8 +489,10 @@ def newick_to_network(newick_filepath, cm, f=1):
     except:
         tree = Tree(newick_filepath)
 
-    # Create dict from ete3 node to cassiopeia.Node
+    # Create dict from ete3 node to cassiopeia.Node; in a postorder walk the
+    # children are already converted, so edges are collected in the same pass
     e2cass = {}
+    edges = []
     for n in tree.traverse("postorder"):
 
         if "|" in n.name:
@@ -483,16 +506,10 @@ def newick_to_network(newick_filepath, cm, f=1):
             nn.is_target = True
 
         e2cass[n] = nn
-        G.add_node(nn)
-
-    for p in tree.traverse("postorder"):
+        edges.extend([(nn, e2cass[c]) for c in n.children])
 
-        pn = e2cass[p]
-
-        for c in p.children:
-            cn = e2cass[c]
-
-            G.add_edge(pn, cn)
+    G.add_nodes_from(e2cass.values())
+    G.add_edges_from(edges)
 
     return G
 
@@ -515,27 +532,22 @@ def get_indel_props(at, group_var=["intBC"]):
 
 	"""
 
-    uniq_alleles = np.union1d(at["r1"], np.union1d(at["r2"], at["r3"]))
-
-    groups = at.groupby(group_var).agg({"r1": "unique", "r2": "unique", "r3": "unique"})
-
-    count = defaultdict(int)
+    # reshape to one (group, allele) pair per row so that each allele is counted
+    # at most once per group with a single de-duplication pass
+    alleles = at.melt(
+        id_vars=group_var, value_vars=["r1", "r2", "r3"], value_name="allele"
+    )
+    alleles = alleles.dropna(subset=group_var + ["allele"]).drop_duplicates(
+        subset=group_var + ["allele"]
+    )
+    alleles = alleles[~alleles["allele"].str.contains("None", regex=False)]
 
-    for i in tqdm(groups.index, desc="Counting unique alleles"):
-        alleles = np.union1d(
-            groups.loc[i, "r1"], np.union1d(groups.loc[i, "r2"], groups.loc[i, "r3"])
-        )
-        for a in alleles:
-            if a != a:
-                continue
-            if "None" not in a:
-                count[a] += 1
+    count = alleles["allele"].value_counts()
 
-    tot = len(groups.index)
-    freqs = dict(zip(list(count.keys()), [v / tot for v in count.values()]))
+    tot = at.groupby(group_var).ngroups
 
-    return_df = pd.DataFrame([count, freqs]).T
-    return_df.columns = ["count", "freq"]
+    # counts are returned as floats, matching the dtype of the freq column
+    return_df = pd.DataFrame({"count": count.astype(float), "freq": count / tot})
 
     return_df.index.name = "indel"
     return return_df
@@ -567,27 +579,21 @@ def process_allele_table(
 		character.
 	"""
 
+    cut_sites = ["_r1", "_r2", "_r3"]
+    if no_context:
+        state_cols = ["r1_no_context", "r2_no_context", "r3_no_context"]
+    else:
+        state_cols = ["r1", "r2", "r3"]
+
+    # walk the needed columns in lockstep rather than doing several .loc lookups
+    # per row
     filtered_samples = defaultdict(OrderedDict)
-    for sample in cm.index:
-        cell = cm.loc[sample, "cellBC"]
-        intBC = cm.loc[sample, "intBC"]
-        cut_sites = ["_r1", "_r2", "_r3"]
-
-        to_add = []
-        i = 1
-        for c in cut_sites:
+    for cell, intBC, states in zip(
+        cm["cellBC"], cm["intBC"], zip(*[cm[col] for col in state_cols])
+    ):
+        for c, state in zip(cut_sites, states):
             if intBC + c not in to_drop:
-                if no_context:
-                    to_add.append(("intBC", c, "r" + str(i) + "_no_context"))
-                else:
-                    to_add.append(("intBC", c, "r" + str(i)))
-
-            i += 1
-
-        for ent in to_add:
-            filtered_samples[cell][cm.loc[sample, ent[0]] + ent[1]] = cm.loc[
-                sample, ent[2]
-            ]
+                filtered_samples[cell][intBC + c] = state
 
     samples_as_string = defaultdict(str)
     allele_counter = defaultdict(OrderedDict)
@@ -680,19 +686,18 @@ def string_to_cm(string_sample_values):
 	"""
 
     m = len(string_sample_values[list(string_sample_values.keys())[0]].split("|"))
-    n = len(string_sample_values.keys())
 
     cols = ["r" + str(i) for i in range(m)]
-    cm = pd.DataFrame(np.zeros((n, m)))
-    indices = []
-    for i, k in zip(range(n), string_sample_values.keys()):
-        indices.append(k)
-        alleles = np.array(string_sample_values[k].split("|"))
-        cm.iloc[i, :] = alleles
-
-    cm.index = indices
+    indices = list(string_sample_values.keys())
+
+    # split every character string up front and build the frame in one shot,
+    # rather than assigning each row into a preallocated frame
+    cm = pd.DataFrame(
+        [string_sample_values[k].split("|") for k in indices],
+        index=indices,
+        columns=cols,
+    )
     cm.index.name = "cellBC"
-    cm.columns = cols
 
     return cm
 
@@ -716,15 +721,10 @@ def write_to_charmat(string_sample_values, out_fp):
         cols = ["cellBC"] + [("r" + str(i)) for i in range(m)]
         f.write("\t".join(cols) + "\n")
 
+        # character strings are already "|"-delimited, so each row is written
+        # with a single call instead of one write per allele
         for k in string_sample_values.keys():
-
-            f.write(k)
-            alleles = string_sample_values[k].split("|")
-
-            for a in alleles:
-                f.write("\t" + str(a))
-
-            f.write("\n")
+            f.write(k + "\t" + string_sample_values[k].replace("|", "\t") + "\n")
 
 
 def alleletable_to_character_matrix(
@@ -822,9 +822,13 @@ def lineage_profile_to_charmat(lp, mutation_map=None):
     samples = []
 
     lp.columns = ["r" + str(i) for i in range(len(lp.columns))]
-    cols_to_unique = dict(
-        zip(lp.columns, [lp[x].factorize()[1].values for x in lp.columns])
-    )
+
+    # factorize each column once; the codes are reused below to map every entry
+    # to its character state with a single array lookup
+    cols_to_codes, cols_to_unique = {}, {}
+    for x in lp.columns:
+        cols_to_codes[x], uniques = pd.factorize(lp[x])
+        cols_to_unique[x] = uniques.values
     cols_to_num = dict(zip(lp.columns, range(lp.shape[1])))
 
     mut_counter = dict(zip(lp.columns, [0] * lp.shape[1]))
@@ -849,14 +853,15 @@ def lineage_profile_to_charmat(lp, mutation_map=None):
                     prior_probs[c][str(mut_to_state[col][_it])] = float(prob)
                     indel_to_charstate[c][str(mut_to_state[col][_it])] = _it
 
-    cm = lp.apply(
-        lambda x: [
-            mut_to_state[x.name][v] if type(v) == str else "-" for v in x.values
-        ],
-        axis=0,
-    )
+    char_states = {}
+    for col in lp.columns:
+        # missing entries are factorized to -1, which picks up the trailing "-"
+        lookup = np.array(
+            [mut_to_state[col][_it] for _it in cols_to_unique[col]] + ["-"], dtype=object
+        )
+        char_states[col] = lookup[cols_to_codes[col]]
 
-    cm.index = lp.index
+    cm = pd.DataFrame(char_states, index=lp.index)
     cm.columns = ["r" + str(i) for i in range(lp.shape[1])]
 
     return cm, prior_probs, indel_to_charstate
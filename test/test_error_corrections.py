@@ -1,68 +1,95 @@
 import numpy as np
 import pandas as pd
+from functools import lru_cache
 from cassiopeia.ProcessingPipeline.process import filterMoleculeTables
 
+# declare the simulated molecule table types up front so read_csv parses each
+# column straight into its final, compact dtype instead of inferring it
+SIM_DATA_DTYPES = {
+    "cellBC": str,
+    "UMI": str,
+    "intBC": str,
+    "readCount": np.int32,
+    "r1": str,
+    "r2": str,
+    "r3": str,
+}
+
+def read_sim_data(fp):
+
+    return pd.read_csv(fp, sep='\t', dtype=SIM_DATA_DTYPES)
+
+@lru_cache(maxsize=None)
+def _read_sim_data_true():
+
+    sdata_true = read_sim_data("test/data/sim_data_true.csv")
+    sdata_true["allele"] = sdata_true["r1"] + sdata_true["r2"] + sdata_true["r3"]
+
+    return sdata_true
+
+def load_sim_data_true():
+
+    # the ground truth table is shared by every test, so parse it once; tests add
+    # columns to it, so each gets its own copy
+    return _read_sim_data_true().copy()
+
 def test_umi_errcorr():
 
-    sdata_true = pd.read_csv("test/data/sim_data_true.csv", sep='\t')
-    sdata_umierr = pd.read_csv("test/data/sim_data_errumi.csv", sep='\t')
-    sdata_true["allele"] = sdata_true.apply(lambda row: row.r1 + row.r2 + row.r3, axis=1)
-    sdata_umierr["allele"] = sdata_umierr.apply(lambda row: row.r1 + row.r2 + row.r3, axis=1)
+    sdata_true = load_sim_data_true()
+    sdata_umierr = read_sim_data("test/data/sim_data_errumi.csv")
+    sdata_umierr["allele"] = sdata_umierr["r1"] + sdata_umierr["r2"] + sdata_umierr["r3"]
 
     corrected = filterMoleculeTables.errorCorrectUMI(sdata_umierr, "", verbose=False)
 
     assert sdata_true.shape[0] == corrected.shape[0]
 
     # Validate that all UMIs were corrected by looking at readcounts
-    sdata_true["gcol"] = sdata_true[["cellBC", "UMI"]].apply(lambda x: '_'.join(x), axis=1)
-    corrected["gcol"] = corrected[["cellBC", "UMI"]].apply(lambda x: '_'.join(x), axis=1)
+    sdata_true["gcol"] = ["_".join(p) for p in zip(sdata_true["cellBC"], sdata_true["UMI"])]
+    corrected["gcol"] = ["_".join(p) for p in zip(corrected["cellBC"], corrected["UMI"])]
 
     # First test that we have the same UMIs as the true dataset
     assert sdata_true["gcol"].equals(corrected["gcol"])
 
-    for i in sdata_true.index:
-
-        gcol = sdata_true.loc[i, "gcol"]
-        rc_true = sdata_true.loc[i, "readCount"]
+    # map each cellBC/UMI to its (first) corrected read count once, rather than
+    # masking the whole corrected table for every row
+    rc_corr = corrected.drop_duplicates("gcol").set_index("gcol")["readCount"].to_dict()
 
-        rc_corr = corrected.loc[corrected["gcol"] == gcol, "readCount"].iloc[0]
+    for gcol, rc_true in zip(sdata_true["gcol"], sdata_true["readCount"]):
 
-        assert rc_corr == rc_true
+        assert rc_corr[gcol] == rc_true
 
 
 def test_ibc_errcorr():
 
-    sdata_true = pd.read_csv("test/data/sim_data_true.csv", sep='\t')
-    sdata_ibcerr = pd.read_csv("test/data/sim_data_erribc.csv", sep='\t')
+    sdata_true = load_sim_data_true()
+    sdata_ibcerr = read_sim_data("test/data/sim_data_erribc.csv")
 
-    sdata_true["allele"] = sdata_true.apply(lambda row: row.r1 + row.r2 + row.r3, axis=1)
-    sdata_ibcerr["allele"] = sdata_ibcerr.apply(lambda row: row.r1 + row.r2 + row.r3, axis=1)
+    sdata_ibcerr["allele"] = sdata_ibcerr["r1"] + sdata_ibcerr["r2"] + sdata_ibcerr["r3"]
 
     corrected = filterMoleculeTables.errorCorrectIntBC(sdata_ibcerr, "", verbose=False)
 
     assert sdata_true.shape == corrected.shape
 
     # Test that intBCs have the same number of UMIs in each cell
-    sdata_true["gcol"] = sdata_true[["cellBC", "intBC"]].apply(lambda x: '_'.join(x), axis=1)
-    corrected["gcol"] = corrected[["cellBC", "intBC"]].apply(lambda x: '_'.join(x), axis=1)
+    sdata_true["gcol"] = ["_".join(p) for p in zip(sdata_true["cellBC"], sdata_true["intBC"])]
+    corrected["gcol"] = ["_".join(p) for p in zip(corrected["cellBC"], corrected["intBC"])]
 
     # Make sure we have the same cell barcode / integration barcode combination
     assert sdata_true["gcol"].equals(corrected["gcol"])
 
-    for i in sdata_true["gcol"].unique():
+    # count UMIs for every cellBC / intBC combination in one groupby per table,
+    # rather than masking both tables for each combination
+    true_vals = sdata_true.groupby(["gcol", "intBC"]).agg({"UMI": "count"})
+    corr_vals = corrected.groupby(["gcol", "intBC"]).agg({"UMI": "count"})
 
-        true_vals = sdata_true.loc[(sdata_true["gcol"] == i),:].groupby(["intBC"]).agg({"UMI": "count"})
-        corr_vals = corrected.loc[(corrected["gcol"] == i), :].groupby(["intBC"]).agg({"UMI": "count"})
-
-        assert true_vals["UMI"].equals(corr_vals["UMI"])
+    assert true_vals["UMI"].equals(corr_vals["UMI"])
 
 def test_allele_corr():
 
-    sdata_true = pd.read_csv("test/data/sim_data_true.csv", sep='\t')
-    sdata_alleles = pd.read_csv("test/data/sim_data_erralleles.csv", sep='\t')
+    sdata_true = load_sim_data_true()
+    sdata_alleles = read_sim_data("test/data/sim_data_erralleles.csv")
 
-    sdata_true["allele"] = sdata_true.apply(lambda row: row.r1 + row.r2 + row.r3, axis=1)
-    sdata_alleles["allele"] = sdata_alleles.apply(lambda row: row.r1 + row.r2 + row.r3, axis=1)
+    sdata_alleles["allele"] = sdata_alleles["r1"] + sdata_alleles["r2"] + sdata_alleles["r3"]
 
     corrected = filterMoleculeTables.pickAlleles(sdata_alleles, "", verbose=False)
 
@@ -71,15 +98,19 @@ def test_allele_corr():
     # Let's make sure that each integration barcode maps to the same allele across
     # the two datasets
 
-    sdata_true["gcol"] = sdata_true[["cellBC", "intBC"]].apply(lambda x: '_'.join(x), axis=1)
-    corrected["gcol"] = corrected[["cellBC", "intBC"]].apply(lambda x: '_'.join(x), axis=1)
+    sdata_true["gcol"] = ["_".join(p) for p in zip(sdata_true["cellBC"], sdata_true["intBC"])]
+    corrected["gcol"] = ["_".join(p) for p in zip(corrected["cellBC"], corrected["intBC"])]
 
     assert sdata_true["gcol"].equals(corrected["gcol"])
 
-    for i in sdata_true["gcol"].unique():
+    # split both tables by cellBC / intBC once, rather than masking them for every
+    # combination; both have the same gcol values, so the sorted groups line up
+    for (i, true_grp), (j, corr_grp) in zip(sdata_true.groupby("gcol"), corrected.groupby("gcol")):
+
+        assert i == j
 
-        true_vals = sdata_true.loc[(sdata_true["gcol"] == i),:].groupby(["intBC"]).agg({"allele": "unique"})
-        corr_vals = corrected.loc[(corrected["gcol"] == i), :].groupby(["intBC"]).agg({"allele": "unique"})
+        true_vals = true_grp.groupby(["intBC"]).agg({"allele": "unique"})
+        corr_vals = corr_grp.groupby(["intBC"]).agg({"allele": "unique"})
 
         # make sure they map equally
         assert true_vals["allele"].equals(corr_vals["allele"])
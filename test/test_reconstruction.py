@@ -1,285 +1,167 @@
 import networkx as nx
-from cassiopeia.TreeSolver import Node
-import cassiopeia.TreeSolver.lineage_solver as ls 
-import cassiopeia.TreeSolver.simulation_tools.simulation_utils as sim_utils
-import cassiopeia as sclt
-from pathlib import Path
+from cassiopeia.TreeSolver.Node import Node
+import cassiopeia.TreeSolver.lineage_solver.lineage_solver as ls
 import pickle as pic
-SCLT_PATH = Path(sclt.__path__[0])
+import pytest
+from contextlib import redirect_stdout
 
 import os
-import sys
 stdout_backup = "testlog"
 
-def test_greedy_simple():
-
-	n1 = Node('a', [1,0,0,0,0])
-	n2 = Node('b', [1,0,0,1,0])
-	n3 = Node('c', [1,0,0,2,0])
-	n4 = Node('d', [1,2,0,1,0])
-	n5 = Node('e', [1,1,0,1,0])
-	n6 = Node('f', [1,0,3,2,0])
-	n7 = Node('g', [0,0,0,0,1])
-	n8 = Node('h', [0,1,0,0,1])
-	n9 = Node('i', [0,1,2,0,1])
-	n10 = Node('j', [0,1,1,0,1])
-
-	nodes = [n1, n2, n3, n4, n5, n6, n7, n8, n9, n10]
-
-	tree = ls.solve_lineage_instance(nodes, method="greedy")
-	net = tree.get_network()
-
-	roots = [n for n in net if net.in_degree(n) == 0]
-
-	assert len(roots) == 1 
-
-	root = roots[0]
-
-	targets = [n for n in net if n.is_target]
-
-	assert len(targets) == len(nodes)
-
-	for t in targets:
-		assert nx.has_path(net, root, t)
-
-
-def test_hybrid_simple():
-
-	n1 = Node('a', [1,0,0,0,0])
-	n2 = Node('b', [1,0,0,1,0])
-	n3 = Node('c', [1,0,0,2,0])
-	n4 = Node('d', [1,2,0,1,0])
-	n5 = Node('e', [1,1,0,1,0])
-	n6 = Node('f', [1,0,3,2,0])
-	n7 = Node('g', [0,0,0,0,1])
-	n8 = Node('h', [0,1,0,0,1])
-	n9 = Node('i', [0,1,2,0,1])
-	n10 = Node('j', [0,1,1,0,1])
-
-	nodes = [n1, n2, n3, n4, n5, n6, n7, n8, n9, n10]
-
-	with open(stdout_backup, "w") as f:
-		sys.stdout = f
-		tree = ls.solve_lineage_instance(nodes, method="hybrid", hybrid_subset_cutoff=3)
-
-	os.remove(stdout_backup)
-
-	net = tree.get_network()
-
-	roots = [n for n in net if net.in_degree(n) == 0]
-
-	assert len(roots) == 1 
-
-	root = roots[0]
-
-	targets = [n for n in net if n.is_target]
-
-	assert len(targets) == len(nodes)
-
-	for t in targets:
-		assert nx.has_path(net, root, t)
-
-def test_ilp_simple():
-
-	n1 = Node('a', [1,0,0,0,0])
-	n2 = Node('b', [1,0,0,1,0])
-	n3 = Node('c', [1,0,0,2,0])
-	n4 = Node('d', [1,2,0,1,0])
-	n5 = Node('e', [1,1,0,1,0])
-	n6 = Node('f', [1,0,3,2,0])
-	n7 = Node('g', [0,0,0,0,1])
-	n8 = Node('h', [0,1,0,0,1])
-	n9 = Node('i', [0,1,2,0,1])
-	n10 = Node('j', [0,1,1,0,1])
-
-	nodes = [n1, n2, n3, n4, n5, n6, n7, n8, n9, n10]
-	with open(stdout_backup, "w") as f:
-		sys.stdout = f
-		tree = ls.solve_lineage_instance(nodes, method="ilp")
-	os.remove(stdout_backup)
-
-	net = tree.get_network()
-
-	roots = [n for n in net if net.in_degree(n) == 0]
-
-	assert len(roots) == 1 
-
-	root = roots[0]
-
-	targets = [n for n in net if n.is_target]
-
-	assert len(targets) == len(nodes)
-
-	for t in targets:
-		assert nx.has_path(net, root, t)
-
-
-def test_greedy_parallel_evo():
-
-	n = Node('a', [1,1,2,0])
-	n2 = Node('b', [1,1,3,0])
-	n3 = Node('c', [2,1,1,0])
-	n4 = Node('d', [2,1,3,0])
-	n5 = Node('e', [1,3,1,'-'])
-	n6 = Node('f', [1, '-', '-', '1'])
-	n7 = Node('g', [1,1,0, 2])
-
-	nodes = [n, n2, n3, n4, n5,n6, n7]
-
-	tree = ls.solve_lineage_instance(nodes, method='greedy')
-	net = tree.get_network()
-
-	roots = [n for n in net if net.in_degree(n) == 0]
-
-	assert len(roots) == 1
-
-	root = roots[0]
-
-	targets = [n for n in net if n.is_target]
-
-	assert len(targets) == len(nodes)
-
-	for t in targets:
-		assert nx.has_path(net, root, t)
-
-	multi_parents = [n for n in net if net.in_degree(n) > 1]
-
-	assert len(multi_parents) == 0
-
-def test_hybrid_parallel_evo():
-
-	n = Node('a', [1,1,2,0])
-	n2 = Node('b', [1,1,3,0])
-	n3 = Node('c', [2,1,1,0])
-	n4 = Node('d', [2,1,3,0])
-	n5 = Node('e', [1,3,1,'-'])
-	n6 = Node('f', [1, '-', '-', '1'])
-	n7 = Node('g', [1,1,0, 2])
-
-	nodes = [n, n2, n3, n4, n5,n6, n7]
-
-	with open(stdout_backup, "w") as f:
-		sys.stdout = f
-		tree = ls.solve_lineage_instance(nodes, method='hybrid', hybrid_subset_cutoff=2)
+def gurobi_solves(n_vars):
+	"""
+	Check whether gurobipy is installed and licensed to solve a model with N_VARS variables,
+	by optimizing an empty model of that size.
+	"""
+
+	try:
+		import gurobipy
+	except ImportError:
+		return False
+
+	try:
+		model = gurobipy.Model()
+		model.Params.OutputFlag = 0
+		model.addVars(n_vars)
+		model.optimize()
+	except gurobipy.GurobiError:
+		return False
+
+	return True
+
+# the ilp and hybrid methods need the optional gurobipy dependency and a usable license;
+# the simulated instance is too large for the size-limited (2000 variable) license
+requires_gurobi = pytest.mark.skipif(not gurobi_solves(1), reason="gurobipy is not installed or licensed")
+requires_full_gurobi = pytest.mark.skipif(not gurobi_solves(2001), reason="gurobi license is size-limited")
+
+def simple_nodes():
+	"""
+	Build the target Nodes of a small instance without parallel evolution. Nodes are built
+	fresh for each test since the solvers mark network nodes as targets in place.
+	"""
+
+	return [
+		Node('a', [1,0,0,0,0]),
+		Node('b', [1,0,0,1,0]),
+		Node('c', [1,0,0,2,0]),
+		Node('d', [1,2,0,1,0]),
+		Node('e', [1,1,0,1,0]),
+		Node('f', [1,0,3,2,0]),
+		Node('g', [0,0,0,0,1]),
+		Node('h', [0,1,0,0,1]),
+		Node('i', [0,1,2,0,1]),
+		Node('j', [0,1,1,0,1]),
+	]
+
+def parallel_evo_nodes():
+	"""
+	Build the target Nodes of a small instance with parallel evolution and missing data.
+	"""
+
+	return [
+		Node('a', [1,1,2,0]),
+		Node('b', [1,1,3,0]),
+		Node('c', [2,1,1,0]),
+		Node('d', [2,1,3,0]),
+		Node('e', [1,3,1,'-']),
+		Node('f', [1, '-', '-', '1']),
+		Node('g', [1,1,0, 2]),
+	]
+
+class LegacyUnpickler(pic.Unpickler):
+	"""
+	Unpickler for test data written before the package was renamed from Cassiopeia to cassiopeia.
+	"""
+
+	def find_class(self, module, name):
+		if module.split(".")[0] == "Cassiopeia":
+			module = "cassiopeia" + module[len("Cassiopeia"):]
+		return super().find_class(module, name)
+
+@pytest.fixture(scope="module")
+def sim_leaves():
+	"""
+	Load the simulated tree once per module and return the name and character vector of each leaf.
+	"""
+
+	with open("test/data/sim_net.pkl", "rb") as f:
+		stree = LegacyUnpickler(f).load()
+
+	return [(l.name, l.get_character_vec()) for l in stree.get_leaves()]
+
+@pytest.fixture
+def sim_targets(sim_leaves):
+	"""
+	Build fresh target Nodes for the simulated tree's leaves.
+	"""
+
+	return [Node(name, vec) for name, vec in sim_leaves]
+
+def solve(nodes, **kwargs):
+	"""
+	Reconstruct a tree from NODES, diverting the solvers' console output to a scratch file.
+	"""
+
+	with open(stdout_backup, "w") as f, redirect_stdout(f):
+		tree, _ = ls.solve_lineage_instance(nodes, **kwargs)
 	os.remove(stdout_backup)
 
-	net = tree.get_network()
-
-	roots = [n for n in net if net.in_degree(n) == 0]
-
-	assert len(roots) == 1
-
-	root = roots[0]
-
-	targets = [n for n in net if n.is_target]
-
-	assert len(targets) == len(nodes)
-
-	for t in targets:
-		assert nx.has_path(net, root, t)
-
-	multi_parents = [n for n in net if net.in_degree(n) > 1]
+	return tree
 
-	assert len(multi_parents) == 0
-
-def test_ilp_parallel_evo():
-
-	n = Node('a', [1,1,2,0])
-	n2 = Node('b', [1,1,3,0])
-	n3 = Node('c', [2,1,1,0])
-	n4 = Node('d', [2,1,3,0])
-	n5 = Node('e', [1,3,1,'-'])
-	n6 = Node('f', [1, '-', '-', '1'])
-	n7 = Node('g', [1,1,0, 2])
-
-	nodes = [n, n2, n3, n4, n5,n6, n7]
-
-	with open(stdout_backup, "w") as f:
-		sys.stdout = f
-		tree = ls.solve_lineage_instance(nodes, method='ilp')
-	os.remove(stdout_backup)
+def check_reconstruction(net, nodes, check_multi_parents=True):
+	"""
+	Assertions shared by every reconstruction test: the network has a single root, one
+	target per distinct input character state, every target is reachable from the root
+	and, optionally, no node has more than one parent.
+	"""
 
-	net = tree.get_network()
+	in_degrees = dict(net.in_degree())
 
-	roots = [n for n in net if net.in_degree(n) == 0]
+	roots = [n for n, d in in_degrees.items() if d == 0]
 
 	assert len(roots) == 1
 
-	root = roots[0]
+	targets = {n for n in net if n.is_target}
 
-	targets = [n for n in net if n.is_target]
+	assert len(targets) == len({n.get_character_string() for n in nodes})
 
-	assert len(targets) == len(nodes)
+	assert targets <= nx.descendants(net, roots[0]) | {roots[0]}
 
-	for t in targets:
-		assert nx.has_path(net, root, t)
+	if check_multi_parents:
+		assert max(in_degrees.values()) <= 1
 
-	multi_parents = [n for n in net if net.in_degree(n) > 1]
+@pytest.mark.parametrize("kwargs", [
+	dict(method="greedy"),
+	pytest.param(dict(method="hybrid", hybrid_cell_cutoff=3), marks=requires_gurobi),
+	pytest.param(dict(method="ilp"), marks=requires_gurobi),
+])
+def test_simple(kwargs):
 
-	assert len(multi_parents) == 0
+	nodes = simple_nodes()
 
-def test_on_sim_greedy():
+	net = solve(nodes, **kwargs).get_network()
 
-	stree = pic.load(open("test/data/sim_net.pkl", "rb"))
-	leaves = stree.get_leaves()
-
-	target_nodes = []
-	for l in leaves:
-		new_node = Node(l.name, l.get_character_vec())
-		target_nodes.append(new_node)
-
-	rtree = ls.solve_lineage_instance(target_nodes, method="greedy")
-
-	rnet = rtree.get_network()
-	roots = [n for n in rnet if rnet.in_degree(n) == 0]
-
-	assert len(roots) == 1
-
-	root =roots[0] 
-
-	targets = [n for n in rnet if n.is_target]
-
-	assert len(targets) == len(target_nodes)
-
-	for t in targets:
-		assert nx.has_path(rnet, root, t)
-
-	multi_parents = [n for n in rnet if rnet.in_degree(n) > 1]
-
-	assert len(multi_parents) == 0
-
-def test_on_sim_hybrid():
-
-
-	stree = pic.load(open("test/data/sim_net.pkl", "rb"))
-	leaves = stree.get_leaves()
-
-	target_nodes = []
-	for l in leaves:
-		new_node = Node(l.name, l.get_character_vec())
-		target_nodes.append(new_node)
-
-	with open(stdout_backup, "w") as f:
-		sys.stdout = f
-		rtree = ls.solve_lineage_instance(target_nodes, method="hybrid", hybrid_subset_cutoff=200, time_limit=100, max_neighborhood_size=500, threads=4)
-
-	os.remove(stdout_backup)
-
-	rnet = rtree.get_network()
-	roots = [n for n in rnet if rnet.in_degree(n) == 0]
-
-	assert len(roots) == 1
+	check_reconstruction(net, nodes, check_multi_parents=False)
 
-	root = roots[0] 
+@pytest.mark.parametrize("kwargs", [
+	dict(method="greedy"),
+	pytest.param(dict(method="hybrid", hybrid_cell_cutoff=2), marks=requires_gurobi),
+	pytest.param(dict(method="ilp"), marks=requires_gurobi),
+])
+def test_parallel_evo(kwargs):
 
-	targets = [n for n in rnet if n.is_target]
+	nodes = parallel_evo_nodes()
 
-	assert len(targets) == len(target_nodes)
+	net = solve(nodes, **kwargs).get_network()
 
-	for t in targets:
-		assert nx.has_path(rnet, root, t)
+	check_reconstruction(net, nodes)
 
-	multi_parents = [n for n in rnet if rnet.in_degree(n) > 1]
+@pytest.mark.parametrize("kwargs", [
+	dict(method="greedy"),
+	pytest.param(dict(method="hybrid", hybrid_cell_cutoff=200, time_limit=100, max_neighborhood_size=500, threads=4), marks=requires_full_gurobi),
+])
+def test_on_sim(sim_targets, kwargs):
 
-	assert len(multi_parents) == 0
+	rnet = solve(sim_targets, **kwargs).get_network()
 
+	check_reconstruction(rnet, sim_targets)